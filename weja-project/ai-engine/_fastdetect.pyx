@@ -0,0 +1,105 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, initializedcheck=False
+"""Aho-Corasick literal pre-filter for the Tier 1 rule engine, compiled to C.
+
+Build in place next to app.py with:
+
+    python setup.py build_ext --inplace
+
+The automaton is flattened into a dense 256-way transition table, so a scan is
+one table lookup per payload byte with the GIL released. ASCII letters are
+folded to lower case during the walk, so callers pass the ASCII-encoded rule
+view (app.rule_view) as-is instead of building a lower-cased copy first.
+"""
+
+from cpython.mem cimport PyMem_Malloc, PyMem_Free
+from libc.stdint cimport int32_t, uint64_t
+
+cdef unsigned char FOLD[256]
+for _i in range(256):
+    FOLD[_i] = _i + 32 if 65 <= _i <= 90 else _i
+
+
+cdef class LiteralMatcher:
+    """Reports which rules have at least one anchor literal in a payload.
+
+    `literals` is an iterable of (lower-case ASCII bytes, rule bitmask) pairs,
+    one bit per rule, so at most 64 rules; scan() returns the OR of the masks of
+    every literal that occurs.
+    """
+
+    cdef int32_t* transitions   # n_states * 256, already fail-resolved
+    cdef uint64_t* outputs      # n_states, masks merged along fail links
+    cdef readonly Py_ssize_t n_states
+    cdef readonly uint64_t full_mask
+
+    def __cinit__(self, literals):
+        goto = [{}]
+        masks = [0]
+        for literal, mask in literals:
+            state = 0
+            for byte in literal:
+                byte = FOLD[byte]
+                nxt = goto[state].get(byte)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][byte] = nxt
+                    goto.append({})
+                    masks.append(0)
+                state = nxt
+            masks[state] |= mask
+
+        # Breadth-first over the trie: resolve every missing edge through the
+        # fail link so the scan never has to follow fail pointers itself.
+        cdef Py_ssize_t n = len(goto)
+        table = [[0] * 256 for _ in range(n)]
+        fail = [0] * n
+        queue = []
+        for byte, nxt in goto[0].items():
+            table[0][byte] = nxt
+            queue.append(nxt)
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            masks[state] |= masks[fail[state]]
+            row = table[state]
+            fallback = table[fail[state]]
+            for byte in range(256):
+                nxt = goto[state].get(byte)
+                if nxt is None:
+                    row[byte] = fallback[byte]
+                else:
+                    row[byte] = nxt
+                    fail[nxt] = fallback[byte]
+                    queue.append(nxt)
+
+        self.n_states = n
+        self.transitions = <int32_t*> PyMem_Malloc(n * 256 * sizeof(int32_t))
+        self.outputs = <uint64_t*> PyMem_Malloc(n * sizeof(uint64_t))
+        if self.transitions == NULL or self.outputs == NULL:
+            raise MemoryError()
+
+        cdef Py_ssize_t s, b
+        cdef uint64_t full = 0
+        for s in range(n):
+            for b in range(256):
+                self.transitions[s * 256 + b] = table[s][b]
+            self.outputs[s] = masks[s]
+            full |= masks[s]
+        self.full_mask = full
+
+    def __dealloc__(self):
+        PyMem_Free(self.transitions)
+        PyMem_Free(self.outputs)
+
+    cpdef uint64_t scan(self, const unsigned char[::1] payload):
+        cdef Py_ssize_t i, n = payload.shape[0]
+        cdef int32_t state = 0
+        cdef uint64_t found = 0
+        with nogil:
+            for i in range(n):
+                state = self.transitions[state * 256 + FOLD[payload[i]]]
+                found |= self.outputs[state]
+                if found == self.full_mask:
+                    break
+        return found
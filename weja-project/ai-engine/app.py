@@ -4,14 +4,83 @@ import sys
 import time
 import math
 import hmac
+import queue
+import functools
+import threading
 import numpy as np
 import pandas as pd
 from flask import Flask, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.preprocessing import FunctionTransformer
 import joblib
 from collections import Counter
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+try:
+    import hyperscan
+except ImportError:  # optional: rule matching falls back to the compiled `re` sets
+    hyperscan = None
+
+try:
+    import re2
+except ImportError:  # optional: the fallback rule sets then use Python's `re`
+    re2 = None
+
+try:
+    import ahocorasick
+except ImportError:  # optional: literal pre-filter falls back to substring checks
+    ahocorasick = None
+
+try:
+    import numba
+    from numba import types as numba_types
+    from numba.typed import Dict as NumbaDict
+except ImportError:  # optional: char n-grams then go through sklearn's own analyzer
+    numba = None
+
+try:
+    import _fastdetect
+except ImportError:  # optional C extension: python setup.py build_ext --inplace
+    _fastdetect = None
+
+try:
+    import orjson
+except ImportError:  # optional: request/response JSON then uses Flask's stdlib provider
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Parses request bodies and renders jsonify() responses with orjson.
+
+    Only dumps()/loads() are overridden; the inherited response() serializes
+    through dumps(), so jsonify() keeps Flask's own argument handling.
+
+    Anything orjson refuses is handed to the stdlib provider instead of raising:
+    JSON.stringify in the proxy emits lone surrogates as "\\udXXX" escapes, which
+    orjson rejects and which would otherwise turn a crafted payload into a 500
+    (i.e. an unblocked request) rather than an analyzed one.
+    """
+
+    OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        try:
+            return orjson.dumps(obj, option=self.OPTIONS).decode('utf-8')
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        try:
+            return orjson.loads(s)
+        except ValueError:
+            return super().loads(s, **kwargs)
+
 
 app = Flask(__name__)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
 CORS(app)
 
 # ==========================================
@@ -67,6 +136,10 @@ def record_training_row(client_ip, features):
 
 
 
+SENSITIVE_PATHS = re.compile(r'etc/passwd|windows\\win')
+PERCENT_ESCAPES = re.compile(r'%[0-9a-f]{2}')
+
+
 def extract_special_features(texts):
     """
     Custom feature engineering function required by the Tier 1 Logistic Regression model.
@@ -82,8 +155,8 @@ def extract_special_features(texts):
             int('../' in text or '..\\' in text),
             int('%' in text),
             int(text.count('/') > 3),
-            int(re.search(r'etc/passwd|windows\\win', lower_text) is not None),
-            len(re.findall(r'%[0-9a-f]{2}', lower_text)),
+            int(SENSITIVE_PATHS.search(lower_text) is not None),
+            len(PERCENT_ESCAPES.findall(lower_text)),
             text.count('.'),
             int(';' in text or '|' in text or '&' in text),
             int('=' in text and '../' in text)
@@ -104,13 +177,279 @@ setattr(sys.modules['__main__'], 'extract_special_features', extract_special_fea
 # 2. GLOBAL DATA PATHS & MODEL LOADING
 # ==========================================
 
+class QuantizedPayloadModel:
+    """Tier 1 model exported by retrain_tier1.py.
+
+    A stateless char n-gram HashingVectorizer (no vocabulary / IDF lookups)
+    feeding Logistic Regression weights stored as int8 with one float scale per
+    class. Exposes the same predict_proba() the sklearn pipeline does.
+    """
+
+    def __init__(self, artifact):
+        self.vectorizer = HashingVectorizer(**artifact['hashing'])
+        self.labels = np.asarray(artifact['labels'])
+        self.weights = artifact['weights']      # (n_features, n_classes) int8
+        self.scale = artifact['scale']          # (n_classes,) float32
+        self.intercept = artifact['intercept']  # (n_classes,) float32
+
+    def predict_proba(self, texts):
+        X = self.vectorizer.transform(texts)
+        logits = np.asarray(X @ self.weights, dtype=np.float32) * self.scale + self.intercept
+        if logits.shape[1] == 1:
+            # Binary LR keeps a single coefficient row: P(labels[1]) = sigmoid
+            positive = 1.0 / (1.0 + np.exp(-logits[:, 0]))
+            return np.column_stack([1.0 - positive, positive])
+        logits -= logits.max(axis=1, keepdims=True)
+        np.exp(logits, out=logits)
+        return logits / logits.sum(axis=1, keepdims=True)
+
+
+# Char n-gram TF-IDF kernel for DenseTier1Model, JIT-compiled when numba is
+# installed. N-grams are looked up by a polynomial hash of their code points; the
+# vocabulary's code points are kept alongside so every hash hit is verified.
+NGRAM_HASH_BASE = 1000003
+WHITESPACE_RUNS = re.compile(r"\s\s+")  # same collapsing as sklearn's char analyzer
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def build_ngram_table(term_codes, term_lens):
+        """Hash -> vocabulary column; also returns the first colliding column (or -1)."""
+        table = NumbaDict.empty(key_type=numba_types.int64, value_type=numba_types.int64)
+        for col in range(term_lens.shape[0]):
+            h = 0
+            for k in range(term_lens[col]):
+                h = h * NGRAM_HASH_BASE + term_codes[col, k]
+            if h in table:
+                return table, col
+            table[h] = col
+        return table, -1
+
+    @numba.njit(cache=True)
+    def char_ngram_tfidf(codes, min_n, max_n, table, term_codes, term_lens, idf, sublinear, l2, out):
+        """Count the vocabulary n-grams of `codes` into `out`, then apply log-tf,
+        idf and the l2 norm in place. Returns the columns it wrote."""
+        n_codes = codes.shape[0]
+        # A column is recorded once, when it first turns non-zero, so the block
+        # width bounds this too: a 10 MB body must not allocate 8 bytes per n-gram
+        touched = np.empty(max(min(n_codes * max_n, out.shape[0]), 1), dtype=np.int64)
+        n_touched = 0
+        for start in range(n_codes):
+            h = 0
+            for n in range(1, max_n + 1):
+                if start + n > n_codes:
+                    break
+                h = h * NGRAM_HASH_BASE + codes[start + n - 1]
+                if n < min_n:
+                    continue
+                if h not in table:
+                    continue
+                col = table[h]
+                if term_lens[col] != n:
+                    continue
+                match = True
+                for k in range(n):
+                    if term_codes[col, k] != codes[start + k]:
+                        match = False
+                        break
+                if not match:
+                    continue
+                if out[col] == 0.0:
+                    touched[n_touched] = col
+                    n_touched += 1
+                out[col] += 1.0
+
+        norm = 0.0
+        for t in range(n_touched):
+            col = touched[t]
+            value = float(out[col])
+            if sublinear:
+                value = np.log(value) + 1.0
+            value *= idf[col]
+            out[col] = value
+            norm += value * value
+        if l2 and norm > 0.0:
+            scale = 1.0 / np.sqrt(norm)
+            for t in range(n_touched):
+                out[touched[t]] *= scale
+        return touched[:n_touched]
+
+
+def jit_char_block(transformer):
+    """Tables for char_ngram_tfidf built from a fitted char TfidfVectorizer."""
+    min_n, max_n = transformer.ngram_range
+    vocabulary = transformer.vocabulary_
+    term_lens = np.zeros(len(vocabulary), dtype=np.int64)
+    term_codes = np.zeros((len(vocabulary), max_n), dtype=np.int64)
+    for term, col in vocabulary.items():
+        if not min_n <= len(term) <= max_n:
+            raise ValueError(f'vocabulary term {term!r} outside ngram_range')
+        term_lens[col] = len(term)
+        term_codes[col, :len(term)] = np.frombuffer(term.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    table, collision = build_ngram_table(term_codes, term_lens)
+    if collision >= 0:
+        raise ValueError(f'n-gram hash collision on {term_codes[collision]}')
+    return {
+        'preprocess': transformer.build_preprocessor(),
+        'min_n': min_n,
+        'max_n': max_n,
+        'table': table,
+        'term_codes': term_codes,
+        'term_lens': term_lens,
+        'idf': transformer.idf_ if transformer.use_idf else np.ones(len(vocabulary)),
+        'sublinear': transformer.sublinear_tf,
+        'l2': transformer.norm == 'l2',
+    }
+
+
+class DenseTier1Model:
+    """Hand-rolled inference for the pickled TF-IDF + Logistic Regression pipeline.
+
+    sklearn's predict_proba() builds a CSR matrix per FeatureUnion branch,
+    hstacks and re-validates them on every call, which dominates the cost on
+    short payloads. The fitted vocabularies, IDF vectors and LR weights are read
+    out of the pipeline once; a payload is scored by writing its TF-IDF values
+    into a preallocated per-thread float32 buffer and doing one dense W @ x.
+    Tokenization reuses each vectorizer's own build_analyzer(), so the n-grams
+    are exactly the ones sklearn would produce; char n-gram branches run
+    through the numba kernel above instead when numba is installed.
+    """
+
+    def __init__(self, pipeline):
+        union = pipeline.named_steps['features']
+        classifier = pipeline.named_steps['classifier']
+        if union.transformer_weights:
+            raise ValueError('weighted FeatureUnion branches are not supported')
+
+        self.blocks = []
+        offset = 0
+        for name, transformer in union.transformer_list:
+            if isinstance(transformer, TfidfVectorizer):
+                if transformer.norm not in ('l2', None):
+                    raise ValueError(f'{name}: unsupported norm {transformer.norm!r}')
+                width = len(transformer.vocabulary_)
+                if numba is not None and transformer.analyzer == 'char':
+                    self.blocks.append(('char_jit', offset, width, jit_char_block(transformer)))
+                else:
+                    self.blocks.append(('tfidf', offset, width, {
+                        'analyzer': transformer.build_analyzer(),
+                        'vocabulary': transformer.vocabulary_,
+                        'idf': transformer.idf_ if transformer.use_idf else None,
+                        'sublinear': transformer.sublinear_tf,
+                        'l2': transformer.norm == 'l2',
+                    }))
+            elif isinstance(transformer, FunctionTransformer) and not transformer.kw_args:
+                width = len(transformer.func(['']).ravel())
+                self.blocks.append(('function', offset, width, {'func': transformer.func}))
+            else:
+                raise ValueError(f'{name}: unsupported transformer {type(transformer).__name__}')
+            offset += width
+
+        self.n_features = offset
+        self.classes_ = classifier.classes_
+        self.weights = np.ascontiguousarray(classifier.coef_, dtype=np.float32)
+        self.intercept = classifier.intercept_.astype(np.float32)
+        if self.weights.shape[1] != self.n_features:
+            raise ValueError(f'classifier expects {self.weights.shape[1]} features, '
+                             f'pipeline produces {self.n_features}')
+        self._local = threading.local()
+
+    def _buffer(self):
+        x = getattr(self._local, 'x', None)
+        if x is None:
+            x = self._local.x = np.zeros(self.n_features, dtype=np.float32)
+        return x
+
+    def _write_features(self, text, x):
+        """Fill x with the payload's features; returns the indices to clear afterwards."""
+        touched = []
+        for kind, offset, width, block in self.blocks:
+            if kind == 'function':
+                x[offset:offset + width] = block['func']([text]).ravel()
+                touched.append(np.arange(offset, offset + width))
+                continue
+
+            if kind == 'char_jit':
+                chars = WHITESPACE_RUNS.sub(' ', block['preprocess'](text))
+                codes = np.frombuffer(chars.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+                idx = char_ngram_tfidf(codes, block['min_n'], block['max_n'], block['table'],
+                                       block['term_codes'], block['term_lens'], block['idf'],
+                                       block['sublinear'], block['l2'], x[offset:offset + width])
+                touched.append(idx + offset)
+                continue
+
+            vocabulary = block['vocabulary']
+            counts = {}
+            for term in block['analyzer'](text):
+                idx = vocabulary.get(term)
+                if idx is not None:
+                    counts[idx] = counts.get(idx, 0) + 1
+            if not counts:
+                continue
+
+            idx = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+            values = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+            if block['sublinear']:
+                values = np.log(values) + 1.0
+            if block['idf'] is not None:
+                values *= block['idf'][idx]
+            if block['l2']:
+                values /= np.sqrt(values @ values)
+            idx += offset
+            x[idx] = values
+            touched.append(idx)
+        return touched
+
+    def predict_proba(self, texts):
+        x = self._buffer()
+        logits = np.empty((len(texts), len(self.intercept)), dtype=np.float64)
+        for row, text in enumerate(texts):
+            touched = self._write_features(text, x)
+            logits[row] = self.weights @ x + self.intercept
+            for idx in touched:
+                x[idx] = 0.0
+        if logits.shape[1] == 1:
+            positive = 1.0 / (1.0 + np.exp(-logits[:, 0]))
+            return np.column_stack([1.0 - positive, positive])
+        logits -= logits.max(axis=1, keepdims=True)
+        np.exp(logits, out=logits)
+        return logits / logits.sum(axis=1, keepdims=True)
+
+
+def try_dense_tier1(pipeline):
+    """Swap the sklearn pipeline for DenseTier1Model if it reproduces its output."""
+    probes = ['', 'GET /index.html', "id=1' OR 1=1 --", '<script>alert(1)</script>',
+              '../../etc/passwd', '; cat /etc/hosts', 'name=John&age=30']
+    try:
+        dense = DenseTier1Model(pipeline)
+        if not np.allclose(dense.predict_proba(probes), pipeline.predict_proba(probes), atol=1e-4):
+            raise ValueError('outputs differ from the sklearn pipeline')
+    except Exception as e:
+        print(f"⚠️ [Tier 1] Dense inference unavailable, using sklearn pipeline: {e}")
+        return pipeline
+    print(f"[Tier 1] Dense float32 inference enabled ({dense.n_features} features).")
+    return dense
+
+
 # Tier 1 Models (Payload Signature / Semantic Analytics)
+# WAF_TIER1_QUANTIZED -> int8 model artifact from retrain_tier1.py; used instead of
+#                        the pickled TF-IDF pipeline whenever the file exists.
+TIER1_QUANTIZED_PATH = os.environ.get('WAF_TIER1_QUANTIZED', 'tier1_hashing_int8.joblib')
+TIER1_LABELS = None  # predict_proba column -> decoded attack label, filled below
 try:
-    payload_model = joblib.load('waf_ai_engine_logistic_regression.pkl')
-    print("[Tier 1] Logistic Regression payload model loaded successfully.")
-    
-    label_encoder = joblib.load('label_encoder.pkl')
-    print("[Tier 1] Label Encoder loaded successfully.")
+    if os.path.exists(TIER1_QUANTIZED_PATH):
+        payload_model = QuantizedPayloadModel(joblib.load(TIER1_QUANTIZED_PATH))
+        TIER1_LABELS = payload_model.labels
+        print(f"[Tier 1] Quantized int8 payload model loaded from {TIER1_QUANTIZED_PATH}.")
+    else:
+        payload_model = joblib.load('waf_ai_engine_logistic_regression.pkl')
+        print("[Tier 1] Logistic Regression payload model loaded successfully.")
+
+        label_encoder = joblib.load('label_encoder.pkl')
+        print("[Tier 1] Label Encoder loaded successfully.")
+
+        # Decode once here instead of label_encoder.inverse_transform() per request
+        TIER1_LABELS = label_encoder.classes_[payload_model.classes_]
+        payload_model = try_dense_tier1(payload_model)
 except Exception as e:
     print(f"⚠️ Error loading Tier 1 core models: {e}")
 
@@ -217,79 +556,211 @@ def calculate_behavioral_features(client_ip):
     }
 
 
+# Tier 1 verdicts are a pure function of the payload text, so repeated probes and
+# common benign requests skip the pipeline. Long payloads bypass the cache so a
+# flood of large bodies can't pin memory.
+ML_CACHE_SIZE = 8192
+ML_CACHE_MAX_PAYLOAD = 4096
+
+
 def predict_payload_anomaly(request_text):
     if not request_text or len(request_text.strip()) == 0:
         return 'SAFE', 0.10
     try:
-        pred_id = payload_model.predict([request_text])[0]
-        probabilities = payload_model.predict_proba([request_text])[0]
-        confidence = float(np.max(probabilities))
-        attack_label = label_encoder.inverse_transform([pred_id])[0]
-        return attack_label, confidence
+        if len(request_text) > ML_CACHE_MAX_PAYLOAD:
+            return score_payload(request_text)
+        # lru_cache only stores returned values, so a failed prediction is
+        # retried on the next request instead of being served as SAFE
+        return _predict_payload_cached(request_text)
     except Exception as err:
         app.logger.error(f"ML prediction error: {err}")
         return 'SAFE', 0.10
 
+
+def predict_payload_batch(texts):
+    """Score many payloads with a single vectorizer + LR pass.
+
+    predict() would run the whole feature pipeline a second time; its answer is
+    just the argmax column of predict_proba().
+    """
+    probabilities = payload_model.predict_proba(texts)
+    best = probabilities.argmax(axis=1)
+    confidences = probabilities[np.arange(len(texts)), best]
+    labels = TIER1_LABELS[best]
+    return [(label, float(conf)) for label, conf in zip(labels, confidences)]
+
+
+class PayloadBatcher:
+    """Coalesces concurrent Tier 1 predictions into one predict_proba() call.
+
+    Request threads enqueue (text, future) and block on the future. A single
+    worker thread takes whatever is queued (waiting up to `window` seconds for
+    more once the first job arrives) and scores it as one batch, so the fixed
+    per-call cost of the sklearn pipeline is paid once per batch, not per request.
+    A request whose batch isn't scored within `timeout` seconds (worker stuck or
+    dead) is scored inline instead of blocking its thread.
+    """
+
+    def __init__(self, predict_batch, max_batch=64, window=0.0, timeout=1.0):
+        self.predict_batch = predict_batch
+        self.max_batch = max_batch
+        self.window = window
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._jobs = None
+        self._worker = None
+        self._pid = None
+
+    def submit(self, text):
+        future = Future()
+        self._ensure_worker().put((text, future))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            app.logger.error(f"Tier 1 batch not scored within {self.timeout}s, scoring inline")
+            return self.predict_batch([text])[0]
+
+    def _ensure_worker(self):
+        # Started lazily, and again after a fork, so every server process gets its own worker
+        with self._lock:
+            if self._pid != os.getpid() or not self._worker.is_alive():
+                # Jobs left on a dead worker's queue (same process) move to the new
+                # one; anything enqueued there after this still times out in submit()
+                orphaned = self._jobs if self._pid == os.getpid() else None
+                self._jobs = queue.Queue()
+                while orphaned is not None:
+                    try:
+                        self._jobs.put(orphaned.get_nowait())
+                    except queue.Empty:
+                        break
+                self._worker = threading.Thread(target=self._run, args=(self._jobs,),
+                                                name='tier1-batcher', daemon=True)
+                self._worker.start()
+                self._pid = os.getpid()
+            return self._jobs
+
+    def _run(self, jobs):
+        while True:
+            batch = [jobs.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(jobs.get(timeout=remaining) if remaining > 0 else jobs.get_nowait())
+                except queue.Empty:
+                    break
+            self._score(batch)
+
+    def _score(self, batch):
+        try:
+            results = self.predict_batch([text for text, _ in batch])
+        except Exception as err:
+            if len(batch) == 1:
+                batch[0][1].set_exception(err)
+                return
+            # One bad payload must not fail its neighbours: score them one by one
+            for job in batch:
+                self._score([job])
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+# WAF_ML_BATCH_WINDOW_MS  -> how long the batcher waits for more requests after the
+#                            first one arrives. 0 (default) only coalesces requests
+#                            that queued up while the previous batch was scoring.
+# WAF_ML_BATCH_TIMEOUT_MS -> how long a request waits for its batch before scoring
+#                            its payload itself (default 1000, well under the
+#                            proxy's 10 s timeout).
+ML_BATCHER = PayloadBatcher(
+    predict_payload_batch,
+    window=float(os.environ.get('WAF_ML_BATCH_WINDOW_MS', '0')) / 1000.0,
+    timeout=float(os.environ.get('WAF_ML_BATCH_TIMEOUT_MS', '1000')) / 1000.0,
+)
+
+
+def score_payload(request_text):
+    # DenseTier1Model has no per-call overhead left to amortize: one payload
+    # costs less than the handoff to the batcher thread and back. Only the
+    # sklearn pipeline and QuantizedPayloadModel go through the batcher.
+    if isinstance(payload_model, DenseTier1Model):
+        return predict_payload_batch([request_text])[0]
+    return ML_BATCHER.submit(request_text)
+
+
+@functools.lru_cache(maxsize=ML_CACHE_SIZE)
+def _predict_payload_cached(request_text):
+    return score_payload(request_text)
+
 # ==========================================
 # 4. SIGNATURE RULES DEFENSE (TIER 1)
 # ==========================================
 
+# (regex, weight, anchors): every match of the regex contains at least one of its
+# lower-case anchor literals. The literal pre-filters skip a category when none
+# of its rules' anchors occur, so a new rule must list its own.
 SQLI_PATTERNS = [
-    (r"(\%27)|(\')|(\-\-)|(\%23)|(#)|(\/\*)|(\*\/)|(;--)|(\%3B--)", 20),
-    (r"((\%3D)|(=))[^\n]*((\%27)|(\')|(\-\-)|(\%3B)|(;)|(\/\*))", 30),
-    (r"(\b(or|and|xor)\b\s+\w+\s*=\s*\w+)", 35),
-    (r"(\w*\s*(or|and|xor)\s+\w+\s*=\s*\w+)", 30),
-    (r"((\%27)|(\')|(\%22)|(\"))\s*(union|UNION)\s+(all|ALL)?\s*select", 45),
-    (r"(union|UNION)\s+(all|ALL)?\s*select\s+.*?\s+from", 40),
-    (r"(exec|EXEC)\s*(\s|\+)+(s|x)p_\w+", 50),
-    (r"(exec|EXECUTE)\s*(\s|\+)*\(.*?\)", 40),
-    (r"\b(select|insert|update|delete|drop|truncate|alter|create|rename|replace)\s+", 25),
-    (r"(1\s*=\s*1|1\s*=\s*'1'|1\s*=\s*\"1\"|'1'\s*=\s*'1'|\"1\"\s*=\s*\"1\")", 35),
-    (r"(\'\s*(or|and|xor)\s*\'|\"\s*(or|and|xor)\s*\")", 35),
-    (r"\b(sleep|benchmark|pg_sleep|waitfor)\s*\(", 45),
-    (r"waitfor\s+delay\s+['\"]\d+:\d+:\d+['\"]", 50),
-    (r"\b(convert|cast)\s*\(.*?\s+as\s+", 35),
-    (r"\b(extractvalue|updatexml|floor)\s*\(.*?,.*?\)", 40),
-    (r";\s*(select|insert|update|delete|drop|truncate|alter|exec|execute)", 35),
-    (r"\b(database|user|version|current_user|system_user)\s*\(\)", 30),
-    (r"\b(@@version|@@datadir|@@basedir)\b", 35),
-    (r"0x[0-9a-fA-F]{4,}", 30),
-    (r"char\s*\([\d,]+\)", 25),
-    (r"unicode\s*(['\"][^'\"]+['\"])", 25),
-    (r"(\b(and|or|xor)\b\s+.*?\s*[=<>!]+\s*.*?\s*(and|or|xor)?\s*\w+\s*[=<>!]+\s*\w+)", 35),
-    (r"\b(substr|mid|left|right)\s*\(.*?,\s*\d+,\s*\d+\)\s*[=<>]", 35),
-    (r"\b(information_schema|sys\.|master\.|mysql\.|performance_schema)\b", 40),
-    (r"\b(load_file|into\s+outfile|into\s+dumpfile)\b", 50),
-    (r"\b(xp_cmdshell|xp_regread|xp_regwrite)\b", 50),
-    (r"\w+\s*\+\s*\w+\s*=\s*\w+", 25),
-    (r"(\/\*.*?\*\/)", 20),
+    (r"(\%27)|(\')|(\-\-)|(\%23)|(#)|(\/\*)|(\*\/)|(;--)|(\%3B--)", 20,
+     ("%27", "'", "--", "%23", "#", "/*", "*/")),
+    (r"((\%3D)|(=))[^\n]*((\%27)|(\')|(\-\-)|(\%3B)|(;)|(\/\*))", 30, ("%3d", "=")),
+    (r"(\b(or|and|xor)\b\s+\w+\s*=\s*\w+)", 35, ("=",)),
+    (r"(\w*\s*(or|and|xor)\s+\w+\s*=\s*\w+)", 30, ("=",)),
+    (r"((\%27)|(\')|(\%22)|(\"))\s*(union|UNION)\s+(all|ALL)?\s*select", 45, ("select",)),
+    (r"(union|UNION)\s+(all|ALL)?\s*select\s+.*?\s+from", 40, ("select",)),
+    (r"(exec|EXEC)\s*(\s|\+)+(s|x)p_\w+", 50, ("exec",)),
+    (r"(exec|EXECUTE)\s*(\s|\+)*\(.*?\)", 40, ("exec",)),
+    (r"\b(select|insert|update|delete|drop|truncate|alter|create|rename|replace)\s+", 25,
+     ("select", "insert", "update", "delete", "drop", "truncate", "alter", "create", "rename",
+      "replace")),
+    (r"(1\s*=\s*1|1\s*=\s*'1'|1\s*=\s*\"1\"|'1'\s*=\s*'1'|\"1\"\s*=\s*\"1\")", 35, ("=",)),
+    (r"(\'\s*(or|and|xor)\s*\'|\"\s*(or|and|xor)\s*\")", 35, ("'", '"')),
+    (r"\b(sleep|benchmark|pg_sleep|waitfor)\s*\(", 45, ("sleep", "benchmark", "waitfor")),
+    (r"waitfor\s+delay\s+['\"]\d+:\d+:\d+['\"]", 50, ("waitfor",)),
+    (r"\b(convert|cast)\s*\(.*?\s+as\s+", 35, ("convert", "cast")),
+    (r"\b(extractvalue|updatexml|floor)\s*\(.*?,.*?\)", 40, ("extractvalue", "updatexml", "floor")),
+    (r";\s*(select|insert|update|delete|drop|truncate|alter|exec|execute)", 35, (";",)),
+    (r"\b(database|user|version|current_user|system_user)\s*\(\)", 30, ("()",)),
+    (r"\b(@@version|@@datadir|@@basedir)\b", 35, ("@@",)),
+    (r"0x[0-9a-fA-F]{4,}", 30, ("0x",)),
+    (r"char\s*\([\d,]+\)", 25, ("char",)),
+    (r"unicode\s*(['\"][^'\"]+['\"])", 25, ("unicode",)),
+    (r"(\b(and|or|xor)\b\s+.*?\s*[=<>!]+\s*.*?\s*(and|or|xor)?\s*\w+\s*[=<>!]+\s*\w+)", 35,
+     ("=", "<", ">", "!")),
+    (r"\b(substr|mid|left|right)\s*\(.*?,\s*\d+,\s*\d+\)\s*[=<>]", 35,
+     ("substr", "mid", "left", "right")),
+    (r"\b(information_schema|sys\.|master\.|mysql\.|performance_schema)\b", 40,
+     ("information_schema", "sys.", "master.", "mysql.", "performance_schema")),
+    (r"\b(load_file|into\s+outfile|into\s+dumpfile)\b", 50, ("load_file", "into")),
+    (r"\b(xp_cmdshell|xp_regread|xp_regwrite)\b", 50, ("xp_",)),
+    (r"\w+\s*\+\s*\w+\s*=\s*\w+", 25, ("=",)),
+    (r"(\/\*.*?\*\/)", 20, ("/*",)),
 ]
 
 XSS_PATTERNS = [
-    (r"<script[^>]*>.*?</script>", 50),
-    (r"javascript\s*:", 35),
-    (r"on\w+\s*=", 25),
-    (r"<\s*img[^>]+onerror", 40),
-    (r"<\s*svg[^>]+onload", 40),
-    (r"alert\s*\(", 25),
-    (r"eval\s*\(", 40),
+    (r"<script[^>]*>.*?</script>", 50, ("<script",)),
+    (r"javascript\s*:", 35, ("javascript",)),
+    (r"on\w+\s*=", 25, ("=",)),
+    (r"<\s*img[^>]+onerror", 40, ("onerror",)),
+    (r"<\s*svg[^>]+onload", 40, ("onload",)),
+    (r"alert\s*\(", 25, ("alert",)),
+    (r"eval\s*\(", 40, ("eval",)),
 ]
 
 PATH_PATTERNS = [
-    (r"\.\./", 40),
-    (r"\.\.\\", 40),
-    (r"%2e%2e%2f", 40),
-    (r"etc/passwd", 60),
-    (r"etc/shadow", 60),
-    (r"windows/system32", 60),
+    (r"\.\./", 40, ("../",)),
+    (r"\.\.\\", 40, ("..\\",)),
+    (r"%2e%2e%2f", 40, ("%2e%2e%2f",)),
+    (r"etc/passwd", 60, ("etc/passwd",)),
+    (r"etc/shadow", 60, ("etc/shadow",)),
+    (r"windows/system32", 60, ("windows/system32",)),
 ]
 
 CMD_PATTERNS = [
-    (r";\s*(ls|cat|whoami|id|pwd|uname)", 50),
-    (r"\|\s*(ls|cat|whoami|id|pwd|uname)", 50),
-    (r"`[^`]+`", 50),
-    (r"\$\([^)]+\)", 50),
-    (r"&&\s*(ls|cat|whoami|id|pwd|uname)", 50),
+    (r";\s*(ls|cat|whoami|id|pwd|uname)", 50, (";",)),
+    (r"\|\s*(ls|cat|whoami|id|pwd|uname)", 50, ("|",)),
+    (r"`[^`]+`", 50, ("`",)),
+    (r"\$\([^)]+\)", 50, ("$(",)),
+    (r"&&\s*(ls|cat|whoami|id|pwd|uname)", 50, ("&&",)),
 ]
 
 ATTACKS = {
@@ -300,27 +771,426 @@ ATTACKS = {
 }
 
 
-def calculate_rule_confidence(payload, patterns):
+# The rules were written for Python's `re` on payload.lower(), where \s, \w, \b,
+# \d and (?i) follow Unicode. Hyperscan and RE2 are ASCII-only in all of these, so
+# the rule engines scan rule_view(payload) instead: an ASCII string on which every
+# rule, with \s spelled out by ascii_rule_regex(), matches exactly where `re`
+# matches it on payload.lower(). check_rule_parity.py verifies that.
+
+# `re` counts \x0b and \x1c-\x1f as \s for str; RE2 and Hyperscan don't
+ASCII_SPACE_CLASS = r'[\t-\r\x1c-\x1f ]'
+RULE_TOKEN = re.compile(r'\\.|\[\^?\]?(?:\\.|[^\]\\])*\]|.', re.S)
+ESCAPED_CHARS = {'n': '\n', 't': '\t', 'r': '\r', 'f': '\f', 'v': '\v'}
+
+
+def ascii_rule_regex(regex):
+    """The rule with \\s spelled out as the ASCII whitespace `re` matches in a str."""
+    tokens = []
+    for token in RULE_TOKEN.findall(regex):
+        if token == r'\s':
+            token = ASCII_SPACE_CLASS
+        elif token.startswith('[') and '\\s' in token:
+            raise ValueError(f'\\s inside a character class is not supported: {regex!r}')
+        tokens.append(token)
+    return ''.join(tokens)
+
+
+def rule_chars(regex):
+    """Every ASCII character a rule spells out, lower-cased, class ranges expanded."""
+    chars = set()
+    for escape, char in re.findall(r'\\(.)|(.)', regex, re.S):
+        if char:
+            chars.add(char.lower())
+        elif not escape.isalpha():
+            chars.add(escape)
+        elif escape in ESCAPED_CHARS:
+            chars.add(ESCAPED_CHARS[escape])
+        # other letter escapes (\s \w \d \b) are classes, not characters
+    for low, high in re.findall(r'(?<!\\)(\w)-(\w)', regex):
+        chars.update(chr(c).lower() for c in range(ord(low), ord(high) + 1))
+    return chars
+
+
+# Stand-ins for the non-ASCII characters of a lowered payload, one per role such
+# a character can play in a rule. Characters that (?i) folds onto an ASCII letter
+# (ı, ſ) become that letter instead.
+VIEW_SPACE = '\x0b'   # \s
+VIEW_WORD = 'z'       # \w but not \d: the one word character no rule spells out
+VIEW_DIGIT = '9'      # \d (so \w too); rules spelling out 9 are re-checked, see DIGIT_RULES
+VIEW_OTHER = '\x7f'   # none of \s \w \d
+
+
+def check_view_stand_ins():
+    for patterns in ATTACKS.values():
+        for regex, _, _ in patterns:
+            clash = rule_chars(regex) & {VIEW_SPACE, VIEW_WORD, VIEW_OTHER}
+            if clash:
+                raise ValueError(f'rule {regex!r} spells out the rule_view stand-in(s) {sorted(clash)}')
+
+
+check_view_stand_ins()
+
+
+class RuleViewTable(dict):
+    """str.translate() table: character -> its ASCII stand-in, filled on first use."""
+
+    ASCII_LETTER = re.compile(r'(?i)[a-z]')
+    MAX_ENTRIES = 1 << 16
+
+    def __init__(self):
+        super().__init__((code, code) for code in range(128))
+
+    def __missing__(self, code):
+        char = chr(code)
+        if self.ASCII_LETTER.fullmatch(char):
+            stand_in = next(a for a in 'abcdefghijklmnopqrstuvwxyz' if re.fullmatch('(?i)' + a, char))
+        elif char.isspace():
+            stand_in = VIEW_SPACE
+        elif char.isdecimal():
+            stand_in = VIEW_DIGIT
+        elif char.isalnum():
+            stand_in = VIEW_WORD
+        else:
+            stand_in = VIEW_OTHER
+        if len(self) < self.MAX_ENTRIES:
+            self[code] = stand_in
+        return stand_in
+
+
+RULE_VIEW_TABLE = RuleViewTable()
+
+
+def rule_view(payload):
+    """The ASCII string the rule engines scan for `payload`, and whether it needs
+    recheck_digit_rules() (it replaced a non-ASCII digit by VIEW_DIGIT).
+
+    An ASCII payload is its own view: every engine is case-insensitive already.
+    """
+    if payload.isascii():
+        return payload, False
+    lowered = payload.lower()
+    view = lowered.translate(RULE_VIEW_TABLE)
+    return view, view.count(VIEW_DIGIT) != lowered.count(VIEW_DIGIT)
+
+
+# Rules spelling out VIEW_DIGIT (0x[0-9a-fA-F]{4,}) can't tell a real 9 from a
+# stand-in for ٣ on a view, so for such views they are matched with `re` on the
+# lowered payload instead
+DIGIT_RULES = {
+    (attack, regex): re.compile(regex, re.IGNORECASE)
+    for attack, patterns in ATTACKS.items()
+    for regex, _, _ in patterns
+    if VIEW_DIGIT in rule_chars(regex)
+}
+# attack -> {regex: (position, weight)}
+RULE_SLOTS = {
+    attack: {regex: (position, weight) for position, (regex, weight, _) in enumerate(patterns)}
+    for attack, patterns in ATTACKS.items()
+}
+
+
+def recheck_digit_rules(category_results, payload):
+    """Re-match DIGIT_RULES on payload.lower() and re-score the categories that changed."""
+    results = {attack: (conf, matches) for attack, conf, matches in category_results}
+    lowered = payload.lower()
+    for (attack, regex), pattern in DIGIT_RULES.items():
+        conf, matches = results.get(attack, (0.0, []))
+        if (pattern.search(lowered) is not None) == (regex in matches):
+            continue
+        if regex in matches:
+            matches = [m for m in matches if m != regex]
+        else:
+            matches = sorted(matches + [regex], key=lambda m: RULE_SLOTS[attack][m][0])
+        conf = min(sum(RULE_SLOTS[attack][m][1] for m in matches) / 100.0, 1.0)
+        results[attack] = (conf, matches)
+    return [(attack, conf, matches) for attack, (conf, matches) in results.items()]
+
+
+# Several rules (the boolean-blind and "or x=y" ones, <script>.*?</script>) backtrack
+# for seconds on crafted payloads under Python's `re`; RE2 matches in linear time.
+REGEX_ENGINE = re2 if re2 is not None else re
+
+# google-re2 re-encodes a str subject to UTF-8 (and maps offsets back) on every
+# search, so its rules are compiled as bytes and fed the view encoded once per
+# request.
+RULES_ON_BYTES = REGEX_ENGINE is re2
+
+
+def compile_rule_regex(regex):
+    # RE2's \s lacks \x0b and \x1c-\x1f; spelled out, both engines agree with
+    # `re` on str for every (ASCII) rule view
+    regex = '(?i)' + ascii_rule_regex(regex)
+    return REGEX_ENGINE.compile(regex.encode('ascii') if RULES_ON_BYTES else regex)
+
+
+def rule_subject(view):
+    """A rule_view() string in the form the compiled fallback rules search."""
+    return view.encode('ascii') if RULES_ON_BYTES else view
+
+
+# A pattern made only of plain characters and backslash-escaped punctuation
+# (e.g. \.\./ or etc/passwd) matches exactly one fixed string.
+LITERAL_PATTERN = re.compile(r'(?:\\\W|[^.^$*+?{}\[\]|()\\])+')
+
+
+def pattern_literal(regex):
+    """The lower-cased string a regex matches if it has no regex syntax, else None."""
+    if not LITERAL_PATTERN.fullmatch(regex):
+        return None
+    return re.sub(r'\\(\W)', r'\1', regex).lower()
+
+
+def compile_rule_set(patterns):
+    """Compile one category's weighted patterns once, at import time.
+
+    Pure-literal patterns are kept as plain strings: a substring test (C-level
+    memchr/two-way search) beats running a regex for them. The remaining
+    patterns are fused into a single alternation (one scan tells us whether
+    any of them can score at all) and also compiled on their own for the
+    per-rule weighting. Case-insensitive matching stays on because some
+    patterns spell out upper-case alternatives (EXECUTE, a-fA-F).
+
+    Returns (merged, rules, regex_mask): rules[position] is (literal, compiled,
+    regex, weight) with exactly one of literal/compiled set, and regex_mask has
+    the bits of the positions that need a regex.
+    """
+    rules = []
+    regex_mask = 0
+    for position, (regex, weight, _) in enumerate(patterns):
+        literal = pattern_literal(regex)
+        if literal is not None:
+            rules.append((literal, None, regex, weight))
+        else:
+            rules.append((None, compile_rule_regex(regex), regex, weight))
+            regex_mask |= 1 << position
+
+    merged = None
+    if regex_mask:
+        merged = compile_rule_regex('|'.join(f'(?:{regex})' for literal, _, regex, _ in rules if literal is None))
+    return merged, rules, regex_mask
+
+
+def compile_attacks():
+    return {attack: compile_rule_set(patterns) for attack, patterns in ATTACKS.items()}
+
+
+try:
+    COMPILED_ATTACKS = compile_attacks()
+except Exception as e:
+    if REGEX_ENGINE is re:
+        raise
+    print(f"⚠️ RE2 rule sets failed to compile, using re fallback: {e}")
+    REGEX_ENGINE = re
+    RULES_ON_BYTES = False
+    COMPILED_ATTACKS = compile_attacks()
+
+
+def calculate_rule_confidence(view, rule_set, subject=None, anchored=None):
+    """Score one category on a rule_view() string.
+
+    `subject` is rule_subject(view), passed in when scoring several categories.
+    `anchored` is a bitmask of the rule positions whose anchors occur in the
+    view (from literal_candidates()); the other rules can't match and are skipped.
+    """
+    merged, rules, regex_mask = rule_set
+    if subject is None:
+        subject = rule_subject(view)
+    if anchored is None:
+        anchored = (1 << len(rules)) - 1
+
+    # Clean for the merged alternation: skip every regex rule. With a single
+    # regex candidate the rule's own search is the cheaper test.
+    regex_candidates = anchored & regex_mask
+    if regex_candidates & (regex_candidates - 1) and merged.search(subject) is None:
+        anchored &= ~regex_mask
+    view_lower = view.lower() if anchored & ~regex_mask else None
+
     score = 0
     matched = []
-
-    for regex, weight in patterns:
-        if re.search(regex, payload, re.IGNORECASE):
+    # Lowest bit first, so matched stays in pattern order
+    while anchored:
+        bit = anchored & -anchored
+        anchored ^= bit
+        literal, pattern, regex, weight = rules[bit.bit_length() - 1]
+        if pattern.search(subject) if literal is None else literal in view_lower:
             score += weight
             matched.append(regex)
 
     return min(score / 100.0, 1.0), matched
 
 
-def rule_based_detect(payload):
-    payload_lower = payload.lower()
+# Flat view of every rule; a pattern's position here is its Hyperscan expression id
+RULE_INDEX = [
+    (attack, regex, weight)
+    for attack, patterns in ATTACKS.items()
+    for regex, weight, _ in patterns
+]
+
+
+def compile_hyperscan_db():
+    """Compile every rule pattern into a single Hyperscan block-mode database.
+
+    SINGLEMATCH reports each expression at most once per scan, which is all the
+    weighted scoring needs to know.
+    """
+    db = hyperscan.Database()
+    db.compile(
+        expressions=[ascii_rule_regex(regex).encode() for _, regex, _ in RULE_INDEX],
+        ids=list(range(len(RULE_INDEX))),
+        elements=len(RULE_INDEX),
+        flags=hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH,
+    )
+    return db
+
+
+HYPERSCAN_DB = None
+if hyperscan is not None:
+    try:
+        HYPERSCAN_DB = compile_hyperscan_db()
+        print(f"[Tier 1] Hyperscan rule database compiled ({len(RULE_INDEX)} patterns).")
+    except Exception as e:
+        print(f"⚠️ Hyperscan rule database failed to compile, using re fallback: {e}")
+
+# Hyperscan scratch space must not be shared by concurrent scans -> one per thread
+_scan_local = threading.local()
+
 
+def _collect_rule_hit(rule_id, start, end, flags, hits):
+    hits.append(rule_id)
+
+
+def hyperscan_rule_confidences(view):
+    """Score every category in one scan of a rule_view() string."""
+    scratch = getattr(_scan_local, 'scratch', None)
+    if scratch is None:
+        scratch = _scan_local.scratch = hyperscan.Scratch(HYPERSCAN_DB)
+
+    hits = []
+    HYPERSCAN_DB.scan(view.encode('ascii'),
+                      match_event_handler=_collect_rule_hit, context=hits, scratch=scratch)
+
+    scores = {attack: 0 for attack in ATTACKS}
+    matched = {attack: [] for attack in ATTACKS}
+    # Ids follow ATTACKS/pattern order, so sorting keeps matched_rules stable
+    for rule_id in sorted(hits):
+        attack, regex, weight = RULE_INDEX[rule_id]
+        scores[attack] += weight
+        matched[attack].append(regex)
+
+    return [(attack, min(scores[attack] / 100.0, 1.0), matched[attack]) for attack in ATTACKS]
+
+
+def collect_literal_rules():
+    """Anchor literal -> bitmask of the RULE_INDEX ids of the rules it anchors."""
+    literals = {}
+    rules = (rule for patterns in ATTACKS.values() for rule in patterns)
+    for rule_id, (regex, _, anchors) in enumerate(rules):
+        if not anchors:
+            raise ValueError(f'rule {regex!r} lists no anchor literals')
+        for anchor in anchors:
+            if not anchor or not anchor.isascii() or anchor != anchor.lower():
+                raise ValueError(f'rule {regex!r}: anchor {anchor!r} must be non-empty lower-case ASCII')
+            literals[anchor] = literals.get(anchor, 0) | 1 << rule_id
+    return literals
+
+
+LITERAL_RULES = collect_literal_rules()
+ALL_RULES = (1 << len(RULE_INDEX)) - 1
+
+
+def rule_spans():
+    """Category -> (RULE_INDEX id of its first rule, mask of its rules shifted down)."""
+    spans = {}
+    first = 0
+    for attack, patterns in ATTACKS.items():
+        spans[attack] = (first, (1 << len(patterns)) - 1)
+        first += len(patterns)
+    return spans
+
+
+ATTACK_RULE_SPANS = rule_spans()
+
+
+def build_literal_automaton():
+    """One Aho-Corasick automaton over every anchor literal -> bitmask of its rules."""
+    automaton = ahocorasick.Automaton()
+    for literal, rules in LITERAL_RULES.items():
+        automaton.add_word(literal, rules)
+    automaton.make_automaton()
+    return automaton
+
+
+LITERAL_AUTOMATON = build_literal_automaton() if ahocorasick is not None else None
+
+
+def build_fast_literal_matcher():
+    return _fastdetect.LiteralMatcher(
+        (literal.encode('ascii'), rules) for literal, rules in LITERAL_RULES.items()
+    )
+
+
+FAST_LITERAL_MATCHER = None
+if _fastdetect is not None:
+    try:
+        FAST_LITERAL_MATCHER = build_fast_literal_matcher()
+    except OverflowError as e:  # its masks are 64-bit: one bit per rule
+        print(f"⚠️ _fastdetect pre-filter failed to build, using pyahocorasick/substring fallback: {e}")
+
+
+def literal_candidates(view):
+    """Bitmask of the RULE_INDEX ids whose anchor literals occur in a rule_view()
+    string (case-insensitive). Only those rules can match it.
+    """
+    if FAST_LITERAL_MATCHER is not None:
+        # C automaton folds case itself and scans with the GIL released
+        return FAST_LITERAL_MATCHER.scan(view.encode('ascii'))
+
+    view_lower = view.lower()
+    found = 0
+    if LITERAL_AUTOMATON is None:
+        for literal, rules in LITERAL_RULES.items():
+            if literal in view_lower:
+                found |= rules
+        return found
+
+    for _, rules in LITERAL_AUTOMATON.iter(view_lower):
+        found |= rules
+        if found == ALL_RULES:
+            break
+    return found
+
+
+def rule_based_detect(payload):
     best_attack = 'SAFE'
     best_conf = 0.0
     best_matches = []
 
-    for attack, patterns in ATTACKS.items():
-        conf, matches = calculate_rule_confidence(payload_lower, patterns)
+    # No payload.lower() copy for ASCII payloads: the view is the payload itself
+    view, recheck = rule_view(payload)
+    if HYPERSCAN_DB is not None:
+        # CASELESS database with its own literal acceleration: scan the view
+        # as-is, no pre-filter needed
+        category_results = hyperscan_rule_confidences(view)
+    else:
+        # The anchors are looked up in the view: (?i) lets a rule's "select" match
+        # "ſelect", which only the view spells with an ASCII s. Only the rules
+        # with an anchor in the view are run.
+        candidates = literal_candidates(view)
+        if not candidates and not recheck:
+            return False, best_attack, best_conf, best_matches
+        # RE2 is ASCII-only like Hyperscan, so the rule sets scan the view too
+        subject = rule_subject(view)
+        category_results = []
+        for attack, rule_set in COMPILED_ATTACKS.items():
+            first, span = ATTACK_RULE_SPANS[attack]
+            anchored = candidates >> first & span
+            if anchored:
+                conf, matches = calculate_rule_confidence(view, rule_set, subject, anchored)
+                category_results.append((attack, conf, matches))
+    if recheck:
+        category_results = recheck_digit_rules(category_results, payload)
+
+    for attack, conf, matches in category_results:
         if conf > best_conf:
             best_attack = attack
             best_conf = conf
@@ -568,7 +1438,9 @@ def behavioural_analysis():
 @app.route('/analyze', methods=['POST'])
 def fallback_analyze():
     try:
-        body_data = request.get_json()
+        # Parsed once here, so don't keep a second reference on the request; a
+        # malformed body is answered with the 400 below instead of a 500
+        body_data = request.get_json(silent=True, cache=False)
         if not body_data:
             return jsonify({'error': 'No JSON body provided', 'blocked': False, 'confidence': 0.0, 'type': 'UNKNOWN'}), 400
         
@@ -606,7 +1478,15 @@ def fallback_analyze():
             })
             traffic_history[client_ip] = traffic_history[client_ip][-200:]
         
-        if len(traffic_history[client_ip]) >= 5:
+        # The proxy forwards the /behavioural/analyze verdict when that call
+        # succeeded: Tier 2 already scored this exact window and any ban is
+        # enforced above, so scoring it again is repeat work. Without a verdict
+        # (the call failed or timed out after recording the event) this route is
+        # the failover and must still score it.
+        behavioral_result = body_data.get('behavioral_result') or body_data.get('behavioral')
+        if already_recorded and isinstance(behavioral_result, dict):
+            pass
+        elif len(traffic_history[client_ip]) >= 5:
             metrics = calculate_behavioral_features(client_ip)
 
             if metrics['req_count'] >= 3:
@@ -634,7 +1514,6 @@ def fallback_analyze():
         req_method = body_data.get('method', 'GET')
         combined_string = f"{payload} {req_path}"
 
-        behavioral_result = body_data.get('behavioral_result') or body_data.get('behavioral')
         if isinstance(behavioral_result, dict) and behavioral_result.get('blocked') is True:
             return jsonify({
                 'blocked': True,
@@ -776,4 +1655,4 @@ if __name__ == '__main__':
         print('⚠️  [*] TRAINING MODE IS ON — secret-bearing requests are never banned. Disable for demos.')
     if OBSERVATION_MODE:
         print('⚠️  [*] OBSERVATION MODE IS ON — Tier 2 logs but never bans anyone.')
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Differential check of the Tier 1 rule engines against plain `re`.
+
+Usage:
+    python check_rule_parity.py [--payloads 20000] [--seed 7] [--show 10]
+
+The signature rules were written for
+
+    re.search(regex, payload.lower(), re.IGNORECASE)
+
+Unicode \\s, \\w, \\b, \\d and case folding included. The engine serves them
+through Hyperscan, RE2 or `re`, behind the _fastdetect / pyahocorasick /
+substring pre-filters, all of which scan rule_view(payload) instead. This
+script runs rule_based_detect() on a fuzzed corpus (control characters,
+Unicode spaces and digits, letters that case-fold to ASCII, lone surrogates,
+...) under every backend combination importable here and compares each
+verdict with the reference above. It also checks that no rule matches a
+payload without one of its anchor literals. It exits 1 on any failure.
+"""
+
+import argparse
+import contextlib
+import io
+import random
+import re
+import sys
+import warnings
+
+warnings.filterwarnings('ignore')
+with contextlib.redirect_stdout(io.StringIO()):
+    import app
+
+WORDS = [
+    'select', 'union', 'all', 'from', 'or', 'and', 'xor', 'exec', 'execute', 'xp_cmdshell',
+    'sp_who', 'insert', 'drop', 'sleep(5)', 'benchmark(', 'waitfor', 'delay', "'0:0:5'",
+    'convert(', 'cast(', 'as', 'extractvalue(1,2)', 'user()', 'version()', '@@version',
+    '0x4142', '0x41٣3', 'char(72,101)', 'char(٣)', "unicode('a')", 'substr(a,1,1)=', 'mid(x,1,2)>',
+    'information_schema', 'sys.', 'load_file', 'into', 'outfile', 'a+b=c', '/*', '*/',
+    '<script>', '</script>', 'javascript:', 'onerror=', 'onload=', '<img', '<svg', 'alert(',
+    'eval(', '../', '..\\', '%2e%2e%2f', 'etc/passwd', 'windows/system32', ';', '|', '&&',
+    '`id`', '$(ls)', 'ls', 'cat', 'whoami', 'id', "'", '"', '=', '1=1', '--', '#', '%27',
+    '%3d', '%3b', '%22', '%23', 'users', 'x', '1', '42', 'name', 'q', 'passwd', 'z', 'Z',
+]
+SEPARATORS = [
+    ' ', '', '\t', '\n', '\r', '\x0b', '\x0c', '\x1c', '\x1f', '\x85', '\xa0', ' ',
+    ' ', '　', '+', '(', ')', ',', '\x00', '\x7f',
+]
+ODD_CHARS = [
+    'İ', 'ı', 'ſ', 'K', 'é', 'ß', 'ẞ', 'Σ', 'ς', 'ǅ', 'ﬁ', '٣', '５', '²', 'Ⅳ', '̇',
+    '\ud800', '€', '😀', '​', 'Ω', 'µ', 'ª', 'z', '9', '_',
+]
+KNOWN = [
+    'union select\x0bpassword\x0bfrom users', "1'\x0bor\x0b1=1", 'select\x0bcat',
+    'lsoutfileand\x0b1=1', 'usersexec\x85xp_cmdshelloutfilefrom1=1', 'ondé=1', 'SELECT\xa0*',
+    'éload_file', 'İinformation_schema--', 'ſelect 1', 'Kunion select a from b', '0x41٣٣',
+    '0x4142', 'ıd=1 ‖ or', "x\ud800' union select 1 --", '', ' ', 'hello world',
+]
+
+
+def reference_detect(payload):
+    """The baseline rule engine: every rule through `re` on payload.lower()."""
+    lowered = payload.lower()
+    best = (False, 'SAFE', 0.0, [])
+    for attack, patterns in app.ATTACKS.items():
+        score = 0
+        matched = []
+        for regex, weight, _ in patterns:
+            if re.search(regex, lowered, re.IGNORECASE):
+                score += weight
+                matched.append(regex)
+        conf = min(score / 100.0, 1.0)
+        if conf > best[2]:
+            best = (True, attack, conf, matched)
+    return best
+
+
+def fuzz_corpus(count, rng):
+    corpus = list(KNOWN)
+    alphabet = [chr(c) for c in range(128)] + SEPARATORS + ODD_CHARS
+    for _ in range(count):
+        if rng.random() < 0.25:
+            corpus.append(''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 40))))
+            continue
+        parts = []
+        for _ in range(rng.randint(1, 8)):
+            word = rng.choice(WORDS)
+            if rng.random() < 0.3:
+                spot = rng.randint(0, len(word))
+                word = word[:spot] + rng.choice(ODD_CHARS) + word[spot:]
+            if rng.random() < 0.2:
+                word = word.upper()
+            parts.append(word)
+            parts.append(rng.choice(SEPARATORS))
+        corpus.append(''.join(parts))
+    return corpus
+
+
+def anchorless_hits(corpus):
+    """rule -> a payload it matches although the view holds none of its anchors."""
+    missing = {}
+    for payload in corpus:
+        view_lower = app.rule_view(payload)[0].lower()
+        lowered = payload.lower()
+        for patterns in app.ATTACKS.values():
+            for regex, _, anchors in patterns:
+                if regex in missing or any(anchor in view_lower for anchor in anchors):
+                    continue
+                if re.search(regex, lowered, re.IGNORECASE):
+                    missing[regex] = payload
+    return missing
+
+
+def backends():
+    """(name, setup) for every rule backend combination available here."""
+    saved = {
+        name: getattr(app, name)
+        for name in ('HYPERSCAN_DB', 'FAST_LITERAL_MATCHER', 'LITERAL_AUTOMATON',
+                     'REGEX_ENGINE', 'RULES_ON_BYTES', 'COMPILED_ATTACKS')
+    }
+
+    def configure(hyperscan_db=None, fast=None, automaton=None, engine=re):
+        def setup():
+            for name, value in saved.items():
+                setattr(app, name, value)
+            app.HYPERSCAN_DB = hyperscan_db
+            app.FAST_LITERAL_MATCHER = fast
+            app.LITERAL_AUTOMATON = automaton
+            if engine is not saved['REGEX_ENGINE']:
+                app.REGEX_ENGINE = engine
+                app.RULES_ON_BYTES = engine is app.re2
+                app.COMPILED_ATTACKS = app.compile_attacks()
+        return setup
+
+    if saved['HYPERSCAN_DB'] is not None:
+        yield 'hyperscan', configure(hyperscan_db=saved['HYPERSCAN_DB'])
+    engines = [('re', re)] + ([('re2', app.re2)] if app.re2 is not None else [])
+    prefilters = [('substring', {})]
+    if saved['LITERAL_AUTOMATON'] is not None:
+        prefilters.append(('ahocorasick', {'automaton': saved['LITERAL_AUTOMATON']}))
+    if saved['FAST_LITERAL_MATCHER'] is not None:
+        prefilters.append(('_fastdetect', {'fast': saved['FAST_LITERAL_MATCHER']}))
+    for engine_name, engine in engines:
+        for prefilter_name, kwargs in prefilters:
+            yield f'{engine_name}+{prefilter_name}', configure(engine=engine, **kwargs)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--payloads', type=int, default=20000, help='fuzzed payloads to generate')
+    ap.add_argument('--seed', type=int, default=7)
+    ap.add_argument('--show', type=int, default=10, help='mismatches to print per backend')
+    args = ap.parse_args()
+
+    corpus = fuzz_corpus(args.payloads, random.Random(args.seed))
+    expected = [reference_detect(payload) for payload in corpus]
+    print(f"[corpus] {len(corpus)} payloads, {sum(e[0] for e in expected)} detected by the reference")
+
+    missing = anchorless_hits(corpus)
+    print(f"[anchors] {'ok' if not missing else f'{len(missing)} RULES MATCH WITHOUT AN ANCHOR'}")
+    for regex, payload in missing.items():
+        print(f"    {regex!r} matches {payload!r}")
+    failed = bool(missing)
+
+    for name, setup in backends():
+        setup()
+        mismatches = []
+        for payload, want in zip(corpus, expected):
+            got = app.rule_based_detect(payload)
+            got = (got[0], got[1], round(got[2], 6), list(got[3]))
+            if got != (want[0], want[1], round(want[2], 6), want[3]):
+                mismatches.append((payload, want, got))
+        status = 'ok' if not mismatches else f'{len(mismatches)} MISMATCHES'
+        print(f"[{name}] {status}")
+        for payload, want, got in mismatches[:args.show]:
+            print(f"    {payload!r}\n        re:   {want[:3]}\n        this: {got[:3]}")
+        failed |= bool(mismatches)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+"""Gunicorn settings for the AI engine (used by the Dockerfile).
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Tier 2 keeps per-IP traffic history, bans and captured training rows in process
+memory, so the engine runs a single worker process: with several, each one
+would only see part of a client's traffic. Concurrency comes from gthread
+workers instead; the regex engines and the sklearn/numpy inference release the
+GIL for most of their runtime, and concurrent Tier 1 requests are micro-batched.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('AI_ENGINE_PORT', os.environ.get('PORT', '5000'))}"
+workers = 1
+worker_class = 'gthread'
+threads = int(os.environ.get('AI_ENGINE_THREADS', str(min(16, 4 * (os.cpu_count() or 1)))))
+timeout = 60
+accesslog = None
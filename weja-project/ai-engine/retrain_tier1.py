@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Train the quantized Tier 1 payload model for the WAF.
+
+Usage:
+    python retrain_tier1.py payloads.csv [more.csv ...] \
+        --out tier1_hashing_int8.joblib [--n-features 1024]
+
+Every input CSV must contain a `payload` column (the text the engine scores:
+"<payload> <path>") and a `label` column. Labels are normalized to the names
+the Flask engine already understands:
+
+        norm   sqli   xss   path-traversal   cmdi
+
+The model is a stateless char n-gram HashingVectorizer feeding a Logistic
+Regression whose weights are quantized to int8 (one scale per class). The
+artifact holds only numpy arrays, so it loads without the sklearn version the
+model was trained with. When it exists next to app.py the engine picks it up
+instead of waf_ai_engine_logistic_regression.pkl (override the path with
+WAF_TIER1_QUANTIZED).
+"""
+
+import argparse
+import json
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import classification_report, confusion_matrix
+from sklearn.model_selection import train_test_split
+
+LABEL_ALIASES = {
+    'norm': 'norm', 'normal': 'norm', 'benign': 'norm', 'safe': 'norm', '0': 'norm',
+    'sqli': 'sqli', 'sql-injection': 'sqli', 'sql_injection': 'sqli',
+    'xss': 'xss',
+    'path-traversal': 'path-traversal', 'path_traversal': 'path-traversal', 'lfi': 'path-traversal',
+    'cmdi': 'cmdi', 'command-injection': 'cmdi', 'command_injection': 'cmdi',
+}
+
+
+def normalize_label(value):
+    key = str(value).strip().lower()
+    if key in LABEL_ALIASES:
+        return LABEL_ALIASES[key]
+    raise ValueError(
+        f"Unrecognized label {value!r}. Use norm/sqli/xss/path-traversal/cmdi "
+        f"(edit LABEL_ALIASES if your dataset uses other names)."
+    )
+
+
+def load_dataset(paths):
+    frames = []
+    for path in paths:
+        df = pd.read_csv(path)
+        missing = [c for c in ('payload', 'label') if c not in df.columns]
+        if missing:
+            sys.exit(f"❌ {path}: missing columns {missing}")
+        df = df[['payload', 'label']].dropna().copy()
+        df['payload'] = df['payload'].astype(str)
+        df['label'] = df['label'].map(normalize_label)
+        frames.append(df)
+        print(f"[load] {path}: {len(df)} rows  {df['label'].value_counts().to_dict()}")
+    return pd.concat(frames, ignore_index=True)
+
+
+def quantize(coef):
+    """Symmetric per-class int8 quantization: coef ~= weights * scale."""
+    scale = np.abs(coef).max(axis=1) / 127.0
+    scale[scale == 0] = 1.0
+    weights = np.round(coef / scale[:, None]).astype(np.int8)
+    return weights, scale.astype(np.float32)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('csvs', nargs='+', help='CSV files with payload + label columns')
+    ap.add_argument('--out', default='tier1_hashing_int8.joblib', help='output artifact path')
+    ap.add_argument('--n-features', type=int, default=1024, help='hashed feature space size')
+    ap.add_argument('--test-size', type=float, default=0.2)
+    args = ap.parse_args()
+
+    data = load_dataset(args.csvs)
+    print(f"\n[dataset] total={len(data)}  {data['label'].value_counts().to_dict()}")
+
+    hashing = {
+        'analyzer': 'char',
+        'ngram_range': (3, 4),
+        'n_features': args.n_features,
+        'alternate_sign': False,
+        'norm': 'l2',
+    }
+    vectorizer = HashingVectorizer(**hashing)
+
+    X_tr, X_te, y_tr, y_te = train_test_split(
+        data['payload'], data['label'], test_size=args.test_size,
+        stratify=data['label'], random_state=42
+    )
+    model = LogisticRegression(class_weight='balanced', max_iter=1000)
+    model.fit(vectorizer.transform(X_tr), y_tr)
+    print(f"[train] HashingVectorizer(char 3-4, {args.n_features}) + LogisticRegression")
+
+    labels = np.array(model.classes_)
+    weights, scale = quantize(model.coef_)
+
+    # ---- Score the held-out set with the float model AND the int8 one the engine runs
+    X_test = vectorizer.transform(X_te)
+    float_pred = model.predict(X_test)
+    logits = np.asarray(X_test @ weights.T) * scale + model.intercept_
+    if logits.shape[1] == 1:
+        int8_pred = labels[(logits[:, 0] > 0).astype(int)]
+    else:
+        int8_pred = labels[logits.argmax(axis=1)]
+
+    print("\n[report] held-out test set (int8 weights)")
+    print(classification_report(y_te, int8_pred, digits=3))
+    print(f"[confusion matrix] rows=true, cols=pred {list(labels)}")
+    print(confusion_matrix(y_te, int8_pred, labels=labels))
+    agreement = float(np.mean(float_pred == int8_pred))
+    print(f"\n[quantization] int8 vs float predictions agree on {agreement:.2%} of the test set")
+    if agreement < 0.99:
+        print("⚠️  Quantization changes more than 1% of verdicts — try a larger --n-features.")
+
+    artifact = {
+        'hashing': hashing,
+        'labels': labels,
+        'weights': np.ascontiguousarray(weights.T),  # (n_features, n_classes)
+        'scale': scale,
+        'intercept': model.intercept_.astype(np.float32),
+    }
+    joblib.dump(artifact, args.out)
+    meta = {
+        'labels': [str(l) for l in labels],
+        'hashing': {**hashing, 'ngram_range': list(hashing['ngram_range'])},
+        'sklearn_version': sklearn.__version__,
+        'train_rows': int(len(X_tr)),
+        'test_rows': int(len(X_te)),
+        'int8_float_agreement': agreement,
+        'sources': args.csvs,
+    }
+    with open(args.out + '.meta.json', 'w') as f:
+        json.dump(meta, f, indent=2)
+    print(f"\n[saved] {args.out}  (+ {args.out}.meta.json)")
+
+
+if __name__ == '__main__':
+    main()
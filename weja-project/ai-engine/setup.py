@@ -0,0 +1,17 @@
+"""Builds the optional _fastdetect C extension used by app.py's rule pre-filter.
+
+    python setup.py build_ext --inplace
+
+app.py falls back to pyahocorasick / substring checks when it isn't built.
+"""
+
+from Cython.Build import cythonize
+from setuptools import Extension, setup
+
+setup(
+    name='weja-ai-engine-fastdetect',
+    ext_modules=cythonize(
+        [Extension('_fastdetect', ['_fastdetect.pyx'], extra_compile_args=['-O3'])],
+        language_level=3,
+    ),
+)